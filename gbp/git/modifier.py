@@ -46,6 +46,13 @@ class GitTz(datetime.tzinfo):
 
 class GitModifier(object):
     """Stores authorship/committer information"""
+    _ENV_KEYS = {'AUTHOR': ('GIT_AUTHOR_NAME',
+                            'GIT_AUTHOR_EMAIL',
+                            'GIT_AUTHOR_DATE'),
+                 'COMMITTER': ('GIT_COMMITTER_NAME',
+                               'GIT_COMMITTER_EMAIL',
+                               'GIT_COMMITTER_DATE')}
+
     def __init__(self, name=None, email=None, date=None):
         """
         @param name: the modifier's name
@@ -82,18 +89,13 @@ class GitModifier(object):
 
     def _get_env(self, who):
         """Get author or committer information as env var dictionary"""
-        who = who.upper()
-        if who not in ['AUTHOR', 'COMMITTER']:
+        try:
+            keys = self._ENV_KEYS[who.upper()]
+        except KeyError:
             raise GitModifierError("Neither committer nor author")
 
-        extra_env = {}
-        if self.name:
-            extra_env['GIT_%s_NAME' % who] = self.name
-        if self.email:
-            extra_env['GIT_%s_EMAIL' % who] = self.email
-        if self.date:
-            extra_env['GIT_%s_DATE' % who] = self.date
-        return extra_env
+        values = (self.name, self.email, self.date)
+        return {key: val for key, val in zip(keys, values) if val}
 
     def get_date(self):
         """Return date as a git raw date"""
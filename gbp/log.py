@@ -120,24 +120,24 @@ class GbpLogger(logging.Logger):
             hdlr.set_format(fmt)
 
 
-def err(msg):
+def err(msg, *args):
     """Logs a message with level ERROR on the GBP logger"""
-    LOGGER.error(msg)
+    LOGGER.error(msg, *args)
 
 
-def warn(msg):
+def warn(msg, *args):
     """Logs a message with level WARNING on the GBP logger"""
-    LOGGER.warning(msg)
+    LOGGER.warning(msg, *args)
 
 
-def info(msg):
+def info(msg, *args):
     """Logs a message with level INFO on the GBP logger"""
-    LOGGER.info(msg)
+    LOGGER.info(msg, *args)
 
 
-def debug(msg):
+def debug(msg, *args):
     """Logs a message with level DEBUG on the GBP logger"""
-    LOGGER.debug(msg)
+    LOGGER.debug(msg, *args)
 
 
 def _parse_color_scheme(color_scheme=""):
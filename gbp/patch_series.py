@@ -24,6 +24,9 @@ from gbp.errors import GbpError
 from gbp.git.repository import GitRepository
 
 VALID_DEP3_ENDS = re.compile(r'(?:---|\*\*\*|Index:)[ \t][^ \t]|^diff -|^---')
+# Lines git-mailinfo considers the start of the actual patch: "diff -",
+# "Index: ", "--- <filename>" or "---" followed by whitespace only
+MAILINFO_PATCH_BREAK = re.compile(rb'diff -|Index: |---(?: \S|\s*$)')
 
 
 class Patch(object):
@@ -76,12 +79,14 @@ class Patch(object):
         if not os.path.exists(self.path):
             return
         # The patch description might contain UTF-8 while the actual patch is ascii.
-        # To unconfuse git-mailinfo stop at the patch separator
+        # To unconfuse git-mailinfo stop at the patch separator or, if
+        # there's none, where the diff starts. No need to read the rest.
         toparse = []
-        for line in open(self.path, 'rb'):
-            if line == b'---\n':
-                break
-            toparse.append(line)
+        with open(self.path, 'rb') as patch:
+            for line in patch:
+                if MAILINFO_PATCH_BREAK.match(line):
+                    break
+                toparse.append(line)
 
         input = b''.join(toparse)
         if input.strip():
@@ -323,9 +328,8 @@ class PatchSeries(list):
         except Exception as err:
             raise GbpError("Cannot open series file: %s" % err)
 
-        queue = cls._read_series(s, patch_dir)
-        s.close()
-        return queue
+        with s:
+            return cls._read_series(s, patch_dir)
 
     @classmethod
     def _read_series(cls, series, patch_dir):
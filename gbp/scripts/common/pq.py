@@ -34,6 +34,9 @@ import gbp.log
 
 PQ_BRANCH_PREFIX = "patch-queue/"
 
+_MAINTAINER_RE = re.compile(r'Maintainer: +(?P<name>.*[^ ]) *<(?P<email>.*)>')
+_PATCH_NUM_RE = re.compile(r'^\d+[-_]*')
+
 
 def is_pq_branch(branch):
     """
@@ -44,7 +47,7 @@ def is_pq_branch(branch):
     >>> is_pq_branch("patch-queue/foo")
     True
     """
-    return [False, True][branch.startswith(PQ_BRANCH_PREFIX)]
+    return branch.startswith(PQ_BRANCH_PREFIX)
 
 
 def pq_branch_name(branch):
@@ -77,6 +80,22 @@ def pq_branch_base(branch):
         return branch
 
 
+def pq_branch_info(branch):
+    """
+    get patch queue status, base branch and patch queue branch for
+    branch in one go
+
+    >>> pq_branch_info("patch-queue/master")
+    (True, 'master', 'patch-queue/master')
+    >>> pq_branch_info("foo")
+    (False, 'foo', 'patch-queue/foo')
+    """
+    if branch.startswith(PQ_BRANCH_PREFIX):
+        return True, branch[len(PQ_BRANCH_PREFIX):], branch
+    else:
+        return False, branch, PQ_BRANCH_PREFIX + branch
+
+
 def parse_gbp_commands(info, cmd_tag, noarg_cmds, arg_cmds, filter_cmds=None):
     """
     Parses gbp commands from commit message. Args with and wthout
@@ -139,7 +158,7 @@ def patch_path_filter(file_status, exclude_regex=None):
 def write_patch_file(filename, commit_info, diff):
     """Write patch file"""
     if not diff:
-        gbp.log.debug("I won't generate empty diff %s" % filename)
+        gbp.log.debug("I won't generate empty diff %s", filename)
         return None
     try:
         with open(filename, 'wb') as patch:
@@ -199,8 +218,7 @@ def format_patch(outdir, repo, commit_info, series, abbrev, numbered=True,
 
     # Determine filename and path
     outdir = os.path.join(outdir, topic)
-    if not os.path.exists(outdir):
-        os.makedirs(outdir)
+    os.makedirs(outdir, exist_ok=True)
 
     try:
         num_prefix = str(patch_num_prefix_format) % (len(series) + 1) \
@@ -216,7 +234,7 @@ def format_patch(outdir, repo, commit_info, series, abbrev, numbered=True,
         if renumber:
             # Remove any existing numeric prefix if the patch
             # should be renumbered
-            name = re.sub(r'^\d+[-_]*', '', name)
+            name = _PATCH_NUM_RE.sub('', name)
         else:
             # Otherwise, clear proposed prefix
             num_prefix = ''
@@ -275,12 +293,10 @@ def format_diff(outdir, filename, repo, start, end, abbrev, path_exclude_regex=N
 def get_maintainer_from_control(repo):
     """Get the maintainer from the control file"""
     control = os.path.join(repo.path, 'debian', 'control')
-
-    maint_re = re.compile('Maintainer: +(?P<name>.*[^ ]) *<(?P<email>.*)>')
     try:
         with open(control, encoding='utf-8') as f:
             for line in f:
-                m = maint_re.match(line)
+                m = _MAINTAINER_RE.match(line)
                 if m:
                     return GitModifier(m.group('name'), m.group('email'))
     except FileNotFoundError:
@@ -311,8 +327,15 @@ def apply_single_patch(repo, branch, patch, fallback_author, topic=None):
     gbp.log.info("Applied %s" % os.path.basename(patch.path))
 
 
-def apply_and_commit_patch(repo, patch, fallback_author, topic=None, name=None):
-    """apply a single patch 'patch', add topic 'topic' and commit it"""
+def apply_and_commit_patch(repo, patch, fallback_author, topic=None, name=None,
+                           parent=None, update_head=True):
+    """
+    apply a single patch 'patch', add topic 'topic' and commit it
+
+    @param parent: commit to use as parent, defaults to the current I{HEAD}
+    @param update_head: whether to point I{HEAD} to the new commit
+    @return: the newly created commit
+    """
     author = {'name': patch.author,
               'email': patch.email,
               'date': patch.date}
@@ -342,13 +365,15 @@ def apply_and_commit_patch(repo, patch, fallback_author, topic=None, name=None):
         msg += "\nGbp-Pq: Name %s" % name
     if author['name']:
         author['name'] = author['name'].encode('utf-8')
-    commit = repo.commit_tree(tree, msg, [repo.head], author=author)
-    repo.update_ref('HEAD', commit, msg="gbp-pq import %s" % patch.path)
+    commit = repo.commit_tree(tree, msg, [parent or repo.head], author=author)
+    if update_head:
+        repo.update_ref('HEAD', commit, msg="gbp-pq import %s" % patch.path)
+    return commit
 
 
 def drop_pq(repo, branch):
-    repo.checkout(pq_branch_base(branch))
-    pq_branch = pq_branch_name(branch)
+    dummy, base, pq_branch = pq_branch_info(branch)
+    repo.checkout(base)
     if repo.has_branch(pq_branch):
         repo.delete_branch(pq_branch)
         gbp.log.info("Dropped branch '%s'." % pq_branch)
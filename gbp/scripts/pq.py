@@ -23,6 +23,7 @@ import shutil
 import sys
 import tempfile
 import re
+from concurrent.futures import ThreadPoolExecutor
 from gbp.config import GbpOptionParserDebian
 from gbp.deb.source import DebianSource
 from gbp.deb.git import DebianGitRepository
@@ -31,7 +32,8 @@ from gbp.command_wrappers import (GitCommand, CommandExecFailed)
 from gbp.errors import GbpError
 import gbp.log
 from gbp.patch_series import (PatchSeries, Patch)
-from gbp.scripts.common.pq import (is_pq_branch, pq_branch_name, pq_branch_base,
+from gbp.scripts.common.pq import (pq_branch_name, pq_branch_base,
+                                   pq_branch_info,
                                    parse_gbp_commands, format_patch,
                                    apply_single_patch,
                                    apply_and_commit_patch,
@@ -43,20 +45,25 @@ from gbp.dch import extract_bts_cmds
 PATCH_DIR = "debian/patches/"
 SERIES_FILE = os.path.join(PATCH_DIR, "series")
 
+_TOPIC_PREFIX = 'gbp-pq-topic:'
+_TOPIC_PREFIX_LEN = len(_TOPIC_PREFIX)
+_TOPIC_RE = re.compile(re.escape(_TOPIC_PREFIX) + r'\s*(?P<topic>\S.*)', flags=re.I)
+
 
 def parse_old_style_topic(commit_info):
     """Parse 'gbp-pq-topic:' line(s) from commit info"""
 
     commit = commit_info['id']
-    topic_regex = r'gbp-pq-topic:\s*(?P<topic>\S.*)'
     mangled_body = ''
     topic = ''
     # Parse and filter commit message body
     for line in commit_info['body'].splitlines():
-        match = re.match(topic_regex, line, flags=re.I)
+        # Only lowercase the prefix, most lines won't match anyway
+        match = (line[:_TOPIC_PREFIX_LEN].lower() == _TOPIC_PREFIX and
+                 _TOPIC_RE.match(line))
         if match:
             topic = match.group('topic')
-            gbp.log.debug("Topic %s found for %s" % (topic, commit))
+            gbp.log.debug("Topic %s found for %s", topic, commit)
             gbp.log.warn("Deprecated 'gbp-pq-topic: <topic>' in %s, please "
                          "use 'Gbp[-Pq]: Topic <topic>' instead" % commit)
             continue
@@ -65,6 +72,39 @@ def parse_old_style_topic(commit_info):
     return topic
 
 
+def _generate_patch(repo, info, outdir, patches, options):
+    """
+    Generate the patch file for a single commit unless it's ignored
+    """
+    # Parse 'gbp-pq-topic:'
+    topic = parse_old_style_topic(info)
+    cmds = {'topic': topic} if topic else {}
+    # Parse 'Gbp: ' style commands
+    (cmds_gbp, info['body']) = parse_gbp_commands(info, 'gbp',
+                                                  ('ignore'),
+                                                  ('topic', 'name'),
+                                                  ('topic', 'name'))
+    cmds.update(cmds)
+    # Parse 'Gbp-Pq: ' style commands
+    (cmds_gbp_pq, info['body']) = parse_gbp_commands(info,
+                                                     'gbp-pq',
+                                                     ('ignore'),
+                                                     ('topic', 'name'),
+                                                     ('topic', 'name'))
+    cmds.update(cmds_gbp_pq)
+    if 'ignore' not in cmds:
+        if 'topic' in cmds:
+            topic = cmds['topic']
+        name = cmds.get('name', None)
+        format_patch(outdir, repo, info, patches, options.abbrev,
+                     numbered=options.patch_numbers,
+                     topic=topic, name=name,
+                     renumber=options.renumber,
+                     patch_num_prefix_format=options.patch_num_format)
+    else:
+        gbp.log.info('Ignoring commit %s' % info['id'])
+
+
 def generate_patches(repo, start, end, outdir, options):
     """
     Generate patch files from git
@@ -77,35 +117,18 @@ def generate_patches(repo, start, end, outdir, options):
 
     # Generate patches
     rev_list = reversed(repo.get_commits(start, end))
-    for commit in rev_list:
-        info = repo.get_commit_info(commit)
-        # Parse 'gbp-pq-topic:'
-        topic = parse_old_style_topic(info)
-        cmds = {'topic': topic} if topic else {}
-        # Parse 'Gbp: ' style commands
-        (cmds_gbp, info['body']) = parse_gbp_commands(info, 'gbp',
-                                                      ('ignore'),
-                                                      ('topic', 'name'),
-                                                      ('topic', 'name'))
-        cmds.update(cmds)
-        # Parse 'Gbp-Pq: ' style commands
-        (cmds_gbp_pq, info['body']) = parse_gbp_commands(info,
-                                                         'gbp-pq',
-                                                         ('ignore'),
-                                                         ('topic', 'name'),
-                                                         ('topic', 'name'))
-        cmds.update(cmds_gbp_pq)
-        if 'ignore' not in cmds:
-            if 'topic' in cmds:
-                topic = cmds['topic']
-            name = cmds.get('name', None)
-            format_patch(outdir, repo, info, patches, options.abbrev,
-                         numbered=options.patch_numbers,
-                         topic=topic, name=name,
-                         renumber=options.renumber,
-                         patch_num_prefix_format=options.patch_num_format)
-        else:
-            gbp.log.info('Ignoring commit %s' % info['id'])
+    # Look up commit information in the background while writing out
+    # patches, each lookup runs git and they're independent of each other
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        lookups = [executor.submit(repo.get_commit_info, commit)
+                   for commit in rev_list]
+        try:
+            for lookup in lookups:
+                _generate_patch(repo, lookup.result(), outdir, patches, options)
+        finally:
+            # Don't wait for lookups nobody will use when bailing out
+            for lookup in lookups:
+                lookup.cancel()
 
     return patches
 
@@ -164,7 +187,8 @@ def commit_patches(repo, branch, patches, options, patch_dir):
     except IOError:
         # No series file yet
         oldpatches = []
-    newpatches = [p[len(patch_dir):] for p in patches]
+    prefix_len = len(patch_dir)
+    newpatches = [p[prefix_len:] for p in patches]
 
     # FIXME: handle case were only the contents of the patches changed
     added, removed = compare_series(oldpatches, newpatches)
@@ -199,20 +223,19 @@ def export_patches(repo, branch, options):
     """Export patches from the pq branch into a patch series"""
     patch_dir = os.path.join(repo.path, PATCH_DIR)
     series_file = os.path.join(repo.path, SERIES_FILE)
-    if is_pq_branch(branch):
-        base = pq_branch_base(branch)
+    is_pq, base, pq_branch = pq_branch_info(branch)
+    if is_pq:
         gbp.log.info("On '%s', switching to '%s'" % (branch, base))
         branch = base
-        repo.set_branch(branch)
+        repo.checkout(branch)
 
-    pq_branch = pq_branch_name(branch)
     try:
         shutil.rmtree(patch_dir)
     except OSError as e:
         if e.errno != errno.ENOENT:
             raise GbpError("Failed to remove patch dir: %s" % e.strerror)
         else:
-            gbp.log.debug("%s does not exist." % patch_dir)
+            gbp.log.debug("%s does not exist.", patch_dir)
 
     if pq_on_upstream_tag(options.pq_from):
         base = find_upstream_commit(repo, branch, options.upstream_tag)
@@ -222,9 +245,14 @@ def export_patches(repo, branch, options):
     patches = generate_patches(repo, base, pq_branch, patch_dir, options)
 
     if patches:
-        with open(series_file, 'w') as seriesfd:
-            for patch in patches:
-                seriesfd.write(os.path.relpath(patch, patch_dir) + '\n')
+        series = ''.join(os.path.relpath(patch, patch_dir) + '\n'
+                         for patch in patches)
+        # Write to a temporary file first so we never leave a partially
+        # written series file behind
+        tmp_series_file = series_file + '.tmp'
+        with open(tmp_series_file, 'w') as seriesfd:
+            seriesfd.write(series)
+        os.replace(tmp_series_file, series_file)
     else:
         gbp.log.info("No patches on '%s' - nothing to export." % pq_branch)
 
@@ -243,6 +271,21 @@ def export_patches(repo, branch, options):
         drop_pq(repo, branch)
 
 
+def _hardlink_tree(src, dst):
+    """
+    Recreate directory tree src at dst hard linking all files
+    instead of copying their contents
+    """
+    os.mkdir(dst)
+    for name in os.listdir(src):
+        srcname = os.path.join(src, name)
+        dstname = os.path.join(dst, name)
+        if os.path.isdir(srcname):
+            _hardlink_tree(srcname, dstname)
+        else:
+            os.link(srcname, dstname)
+
+
 def safe_patches(series, repo):
     """
     Safe the current patches in a temporary directory
@@ -260,8 +303,14 @@ def safe_patches(series, repo):
     patches = os.path.join(tmpdir, 'patches')
     series = os.path.join(patches, name)
 
-    gbp.log.debug("Saving patches '%s' in '%s'" % (src, tmpdir))
-    shutil.copytree(src, patches)
+    gbp.log.debug("Saving patches '%s' in '%s'", src, tmpdir)
+    # Patches aren't modified in place so hard links suffice
+    try:
+        _hardlink_tree(src, patches)
+    except OSError as e:
+        gbp.log.debug("Can't hard link patches (%s), copying instead", e)
+        shutil.rmtree(patches, ignore_errors=True)
+        shutil.copytree(src, patches)
 
     return (tmpdir, series)
 
@@ -286,15 +335,13 @@ def import_quilt_patches(repo, branch, series, tries, force, pq_from,
     tmpdir = None
     series = os.path.join(repo.path, series)
 
-    if is_pq_branch(branch):
+    is_pq, base, pq_branch = pq_branch_info(branch)
+    if is_pq:
         if force:
-            branch = pq_branch_base(branch)
-            pq_branch = pq_branch_name(branch)
+            branch = base
             repo.checkout(branch)
         else:
             raise GbpError("Already on a patch-queue branch '%s' - doing nothing." % branch)
-    else:
-        pq_branch = pq_branch_name(branch)
 
     if repo.has_branch(pq_branch):
         if force:
@@ -318,36 +365,52 @@ def import_quilt_patches(repo, branch, series, tries, force, pq_from,
     queue = PatchSeries.read_series_file(series)
 
     i = len(commits)
+    on_pq_branch = False
     for commit in commits:
         if len(commits) > 1:
             gbp.log.info("%d %s left" % (i, 'tries' if i > 1 else 'try'))
-        try:
-            gbp.log.info("Trying to apply patches at '%s'" % commit)
-            repo.create_branch(pq_branch, commit)
-        except GitRepositoryError:
-            raise GbpError("Cannot create patch-queue branch '%s'." % pq_branch)
-
-        repo.set_branch(pq_branch)
+        gbp.log.info("Trying to apply patches at '%s'" % commit)
+        if on_pq_branch:
+            # Still on the branch of the failed try, just move it back
+            repo.force_head(commit, hard=True)
+        else:
+            try:
+                repo.create_branch(pq_branch, commit)
+            except GitRepositoryError:
+                raise GbpError("Cannot create patch-queue branch '%s'." % pq_branch)
+            # We know we're on 'branch' so no need to ask git
+            repo.checkout(pq_branch)
+            on_pq_branch = True
+
+        # Each commit becomes the parent of the next one, no need to
+        # ask git for HEAD every time. Since patches are applied to the
+        # index HEAD only needs to be moved once the whole series is in.
+        parent = repo.head
         for patch in queue:
-            gbp.log.debug("Applying %s" % patch.path)
+            gbp.log.debug("Applying %s", patch.path)
             try:
                 name = os.path.basename(patch.path)
-                apply_and_commit_patch(repo, patch, maintainer, patch.topic, name)
+                parent = apply_and_commit_patch(repo, patch, maintainer,
+                                                patch.topic, name,
+                                                parent=parent,
+                                                update_head=False)
             except (GbpError, GitRepositoryError) as e:
                 gbp.log.err("Failed to apply '%s': %s" % (patch.path, e))
-                repo.force_head('HEAD', hard=True)
-                repo.set_branch(branch)
-                repo.delete_branch(pq_branch)
                 break
         else:
             # All patches applied successfully
+            if queue:
+                repo.update_ref('HEAD', parent, msg="gbp-pq import %s" % pq_branch)
             break
         i -= 1
     else:
+        repo.force_head('HEAD', hard=True)
+        repo.checkout(branch)
+        repo.delete_branch(pq_branch)
         raise GbpError("Couldn't apply patches")
 
     if tmpdir:
-        gbp.log.debug("Remove temporary patch safe '%s'" % tmpdir)
+        gbp.log.debug("Remove temporary patch safe '%s'", tmpdir)
         shutil.rmtree(tmpdir)
 
     return len(queue)
@@ -387,8 +450,8 @@ def maybe_import_pq(repo, branch, options):
 
 def switch_pq(repo, branch, options):
     """Switch to patch-queue branch if on base branch and vice versa"""
-    if is_pq_branch(branch):
-        base = pq_branch_base(branch)
+    is_pq, base, dummy = pq_branch_info(branch)
+    if is_pq:
         gbp.log.info("Switching to %s" % base)
         repo.checkout(base)
     else:
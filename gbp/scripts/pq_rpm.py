@@ -23,6 +23,7 @@ import errno
 import gzip
 import os
 import re
+import shutil
 import sys
 
 import gbp.log
@@ -247,10 +248,8 @@ def safe_patches(queue):
             src = open(patch.path, 'rb')
             dst_name = os.path.join(tmpdir, os.path.basename(patch.path))
 
-        dst = open(dst_name, 'wb')
-        dst.write(src.read())
-        src.close()
-        dst.close()
+        with src, open(dst_name, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
 
         safequeue.append(patch)
         safequeue[-1].path = dst_name
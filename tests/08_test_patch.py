@@ -39,6 +39,27 @@ class TestPatch(unittest.TestCase):
                          p.long_desc)
         self.assertEqual('Sat, 24 Dec 2011 12:05:53 +0100', p.date)
 
+    def test_header_no_separator(self):
+        """Get the patch information from a patch without '---' separator"""
+        patchfile = os.path.join(self.data_dir, "no-separator.patch")
+        self.assertTrue(os.path.exists(patchfile))
+        p = Patch(patchfile)
+        self.assertEqual('This is a patch without separator', p.subject)
+        self.assertEqual("foo", p.author)
+        self.assertEqual("The description ends where the diff starts.\n",
+                         p.long_desc)
+
+    def test_header_dashes(self):
+        """Don't mistake '---' lines in the description for the separator"""
+        patchfile = os.path.join(self.data_dir, "dashes-in-description.patch")
+        self.assertTrue(os.path.exists(patchfile))
+        p = Patch(patchfile)
+        self.assertEqual('Dashes in the description', p.subject)
+        self.assertEqual("body\n"
+                         "---  text\n"
+                         "more\n",
+                         p.long_desc)
+
 
 class TestDep3Patch(unittest.TestCase):
     data_dir = os.path.splitext(__file__)[0] + '_data'
@@ -18,14 +18,19 @@
 from . import context
 from . import testutils
 
+import errno
 import os
+import threading
 import unittest
 
+import mock
+
 from gbp.command_wrappers import GitCommand
+from gbp.errors import GbpError
 from gbp.scripts.pq import (generate_patches, export_patches,
                             import_quilt_patches, rebase_pq,
-                            switch_pq,
-                            SERIES_FILE)
+                            switch_pq, parse_old_style_topic,
+                            safe_patches, SERIES_FILE)
 import gbp.scripts.common.pq as pq
 import gbp.patch_series
 
@@ -77,6 +82,26 @@ class TestApplyAndCommit(testutils.DebianGitTestRepo):
         info = self.repo.get_commit_info('HEAD')
         self.assertIn('Gbp-Pq: Name foobar', info['body'])
 
+    def test_parent(self):
+        """Test if passing the parent commit works"""
+        patch = gbp.patch_series.Patch(_patch_path('foo.patch'))
+        self.add_file('baz')
+        parent = self.repo.rev_parse('HEAD^')
+
+        commit = pq.apply_and_commit_patch(self.repo, patch, None, parent=parent)
+        self.assertEqual(commit, self.repo.head)
+        self.assertEqual(self.repo.rev_parse('%s^' % commit), parent)
+
+    def test_no_update_head(self):
+        """Test that HEAD stays put if requested"""
+        patch = gbp.patch_series.Patch(_patch_path('foo.patch'))
+        head = self.repo.head
+
+        commit = pq.apply_and_commit_patch(self.repo, patch, None, update_head=False)
+        self.assertNotEqual(commit, head)
+        self.assertEqual(self.repo.head, head)
+        self.assertEqual(self.repo.rev_parse('%s^' % commit), head)
+
     @testutils.skip_without_cmd('dpkg')
     def test_debian_missing_author(self):
         """
@@ -221,6 +246,57 @@ class TestWritePatch(testutils.DebianGitTestRepo):
         opts.patch_num_format = '%02d_'
         self._test_generate_patches(changes, expected_patches, opts)
 
+    def test_generate_patches_order(self):
+        """Test that patches keep the commit order"""
+        changes = [('a', 'a', "added a\n\nGbp-Pq: Topic t1"),
+                   ('b', 'b', "added b\n\nGbp-Pq: Ignore"),
+                   ('c', 'c', "added c\n\ngbp-pq-topic: t2"),
+                   ('d', 'd', "added d\n\nGbp-Pq: Name named.diff"),
+                   ('e', 'e', "added e"),
+                   ('f', 'f', "added f\n\nGbp-Pq: Ignore"),
+                   ('g', 'g', "added g\n\nGbp-Pq: Topic t1")]
+        for c in changes:
+            self.add_file(*c)
+
+        d = str(context.new_tmpdir(__name__))
+        opts = TestPqOptions()
+        opts.patch_numbers = True
+        patches = generate_patches(self.repo, 'HEAD~%d' % len(changes), 'HEAD', d, opts)
+        self.assertEqual([os.path.relpath(p, d) for p in patches],
+                         ['t1/0001-added-a.patch',
+                          't2/0002-added-c.patch',
+                          'named.diff',
+                          '0004-added-e.patch',
+                          't1/0005-added-g.patch'])
+
+    def test_generate_patches_error(self):
+        """Test that pending commit lookups get cancelled on errors"""
+        num = 10
+        for i in range(num):
+            self.add_file('f%d' % i, 'f', 'added f%d' % i)
+
+        lookups = []
+        block = threading.Event()
+        get_commit_info = self.repo.get_commit_info
+
+        def _get_commit_info(commit):
+            lookups.append(commit)
+            if len(lookups) > 1:
+                block.wait()
+            return get_commit_info(commit)
+
+        def _format_patch(*args, **kwargs):
+            # Keep the running lookups busy until the rest got cancelled
+            threading.Timer(0.5, block.set).start()
+            raise GbpError("format failed")
+
+        d = str(context.new_tmpdir(__name__))
+        with mock.patch.object(self.repo, 'get_commit_info', side_effect=_get_commit_info), \
+                mock.patch('gbp.scripts.pq.format_patch', side_effect=_format_patch):
+            with self.assertRaisesRegex(GbpError, "format failed"):
+                generate_patches(self.repo, 'HEAD~%d' % num, 'HEAD', d, TestPqOptions())
+        self.assertLess(len(lookups), num)
+
 
 class TestExport(testutils.DebianGitTestRepo):
     class Options(TestPqOptions):
@@ -322,6 +398,121 @@ class TestParseGbpCommand(unittest.TestCase):
         self.assertEquals(body, 'Foo')
 
 
+class TestImport(testutils.DebianGitTestRepo):
+    """Test L{gbp.pq}'s import_quilt_patches"""
+
+    def setUp(self):
+        testutils.DebianGitTestRepo.setUp(self)
+        self.add_file('debian/control')
+        self.add_file('bar', 'x\n')
+        self.add_file('debian/patches/series', 'p.patch\n')
+        self.add_file('debian/patches/p.patch',
+                      'From: Foo <foo@example.com>\n'
+                      'Subject: bar\n'
+                      '\n'
+                      '---\n'
+                      '--- a/bar\n'
+                      '+++ b/bar\n'
+                      '@@ -1 +1 @@\n'
+                      '-x\n'
+                      '+y\n')
+
+    def _import(self, tries):
+        return import_quilt_patches(self.repo,
+                                    branch='master',
+                                    series=SERIES_FILE,
+                                    tries=tries,
+                                    force=False,
+                                    pq_from='DEBIAN',
+                                    upstream_tag=None)
+
+    def test_import(self):
+        self.assertEqual(self._import(1), 1)
+        self.assertEqual(self.repo.get_branch(), 'patch-queue/master')
+        self.assertEqual(self.repo.get_commit_info('HEAD')['subject'], 'bar')
+        self.assertEqual(self.repo.rev_parse('HEAD^'), self.repo.rev_parse('master'))
+        self.assertTrue(self.repo.is_clean()[0])
+
+    def test_time_machine(self):
+        """Test going back in history when patches don't apply"""
+        self.add_file('bar', 'z\n')
+        with self.assertRaisesRegex(GbpError, "Couldn't apply patches"):
+            self._import(1)
+        self.assertEqual(self.repo.get_branch(), 'master')
+        self.assertFalse(self.repo.has_branch('patch-queue/master'))
+
+        self.assertEqual(self._import(2), 1)
+        self.assertEqual(self.repo.get_branch(), 'patch-queue/master')
+        self.assertEqual(self.repo.rev_parse('HEAD^'), self.repo.rev_parse('master^'))
+        self.assertTrue(self.repo.is_clean()[0])
+
+
+class TestSafePatches(testutils.DebianGitTestRepo):
+    """Test L{gbp.pq}'s safe_patches"""
+
+    def setUp(self):
+        testutils.DebianGitTestRepo.setUp(self)
+        self.add_file('debian/patches/series', 'a.patch\ntopic/b.patch\n')
+        self.add_file('debian/patches/a.patch', 'a')
+        self.add_file('debian/patches/topic/b.patch', 'b')
+        self.series = os.path.join(self.repo.path, SERIES_FILE)
+        self.patch_dir = os.path.dirname(self.series)
+
+    def _check_safed(self, tmpdir, safed):
+        self.assertEqual(safed, os.path.join(tmpdir, 'patches', 'series'))
+        for name, content in [('a.patch', 'a'), ('topic/b.patch', 'b')]:
+            with open(os.path.join(tmpdir, 'patches', name)) as f:
+                self.assertEqual(f.read(), content)
+
+    def test_safe_patches(self):
+        """Test that patches get hard linked"""
+        tmpdir, safed = safe_patches(self.series, self.repo)
+        self._check_safed(tmpdir, safed)
+        for name in ['series', 'a.patch', 'topic/b.patch']:
+            self.assertTrue(os.path.samefile(os.path.join(self.patch_dir, name),
+                                             os.path.join(tmpdir, 'patches', name)))
+
+        # Changing the checkout must not affect the safed patches
+        GitCommand('rm', cwd=self.repo.path)(['-rq', 'debian/patches'])
+        self._check_safed(tmpdir, safed)
+
+    def test_safe_patches_copy_fallback(self):
+        """Test that patches get copied if hard linking fails midway"""
+        real_link = os.link
+        calls = []
+
+        def _link(src, dst):
+            calls.append(src)
+            if len(calls) > 1:
+                raise OSError(errno.EXDEV, "Invalid cross-device link")
+            real_link(src, dst)
+
+        with mock.patch('os.link', side_effect=_link):
+            tmpdir, safed = safe_patches(self.series, self.repo)
+        self.assertGreater(len(calls), 1)
+        self._check_safed(tmpdir, safed)
+        for name in ['series', 'a.patch', 'topic/b.patch']:
+            self.assertFalse(os.path.samefile(os.path.join(self.patch_dir, name),
+                                              os.path.join(tmpdir, 'patches', name)))
+
+
+class TestParseOldStyleTopic(unittest.TestCase):
+    def test_topic(self):
+        """Test parsing and filtering of an old style topic line"""
+        info = {'id': 'abc',
+                'body': '\n'.join(["Foo",
+                                   "GBP-PQ-Topic: bar",
+                                   "Gbp-pq-topic:"])}
+        topic = parse_old_style_topic(info)
+        self.assertEquals(topic, 'bar')
+        self.assertEquals(info['body'], 'Foo\nGbp-pq-topic:\n')
+
+    def test_no_topic(self):
+        info = {'id': 'abc', 'body': 'Foo\nBar'}
+        self.assertEquals(parse_old_style_topic(info), '')
+        self.assertEquals(info['body'], 'Foo\nBar\n')
+
+
 class TestFromTAG(testutils.DebianGitTestRepo):
     """Test L{gbp.pq}'s pq-from=TAG"""
 